@@ -0,0 +1,484 @@
+import random
+import socket
+import threading
+import time
+from collections import defaultdict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+except ImportError:
+    httpx = None
+
+HTTP2_AVAILABLE = httpx is not None
+
+
+class DNSCache:
+    """
+    Per-fetcher cache of DNS answers.
+    Successful lookups are reused for `ttl` seconds; failures are not cached.
+    """
+
+    def __init__(self, ttl=300, resolver=socket.getaddrinfo):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._resolve = resolver
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def getaddrinfo(self, *args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+        result = self._resolve(*args, **kwargs)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (now + self.ttl, result)
+        return result
+
+    def addresses(self, host, port):
+        """Every address for host:port in resolver order, from the cache when possible."""
+        addresses = []
+        for *_, sockaddr in self.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of fetching from a host whose circuit breaker is open."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for transient failures: timeouts,
+    connection errors (other than TLS/certificate errors) and the statuses in
+    `retry_statuses`. A Retry-After header on the response replaces the
+    computed delay; one asking for more than `max_retry_after` seconds makes
+    the page be given up instead. Each page gets at most `max_retries` retries.
+    """
+
+    def __init__(self, max_retries=3, backoff=0.5, max_backoff=30, max_retry_after=300,
+                 retry_statuses=(429, 500, 502, 503, 504), jitter=True):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = set(retry_statuses)
+        self.jitter = jitter
+
+    def is_retryable(self, error):
+        if isinstance(error, requests.exceptions.SSLError):
+            return False
+        if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+            return True
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code in self.retry_statuses
+
+    def retry_after(self, error):
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        return parse_retry_after(response.headers.get('Retry-After'))
+
+    def delay(self, attempt, error=None):
+        """Seconds to wait before retry number `attempt` (0-based), or None to give up."""
+        if attempt >= self.max_retries:
+            return None
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `failure_threshold` consecutive failed
+    requests a host is open (no requests) for `reset_timeout` seconds; then a
+    single trial request is let through, which closes the circuit on success
+    or re-opens it on failure. `trips` counts consecutive openings per host.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = defaultdict(int)
+        self.trips = defaultdict(int)
+        self.opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow(self, host):
+        with self._lock:
+            opened = self.opened_at.get(host)
+            if opened is None:
+                return True
+            if time.monotonic() - opened >= self.reset_timeout:
+                # Half-open: let one trial request through
+                self.opened_at[host] = time.monotonic()
+                return True
+            return False
+
+    def is_open(self, host):
+        return host in self.opened_at
+
+    def retry_at(self, host):
+        """time.monotonic() value from which the host may be tried again (0 if closed)."""
+        opened = self.opened_at.get(host)
+        return 0.0 if opened is None else opened + self.reset_timeout
+
+    def reset_trips(self):
+        """Forget past openings, so hosts given up on earlier are tried again."""
+        with self._lock:
+            self.trips.clear()
+
+    def record_success(self, host):
+        with self._lock:
+            self.failures.pop(host, None)
+            self.trips.pop(host, None)
+            self.opened_at.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            self.failures[host] += 1
+            if self.failures[host] >= self.failure_threshold:
+                self.opened_at[host] = time.monotonic()
+                self.trips[host] += 1
+
+
+class HostParking:
+    """
+    Holds URLs that failed transiently, grouped by host, until they may be
+    tried again: the retry policy's backoff for the URL has passed, the
+    host's Retry-After (which applies to every URL of the host) has passed,
+    and the host's circuit breaker lets requests through.
+
+    A URL is given up once `retry` says so. A host is given up, with all its
+    parked URLs, once its circuit has opened `max_trips` times in a row.
+    Being turned away by an open circuit costs a URL nothing.
+    """
+
+    def __init__(self, breaker, retry=None, max_trips=3):
+        self.breaker = breaker
+        self.retry = retry or RetryPolicy()
+        self.max_trips = max_trips
+        self.attempts = defaultdict(int)
+        self.not_before = {}
+        self.parked = defaultdict(list)     # host -> [(ready_at, url)]
+
+    def __len__(self):
+        return sum(len(urls) for urls in self.parked.values())
+
+    def is_dead(self, host):
+        return self.breaker.trips[host] >= self.max_trips
+
+    def park(self, url, error=None):
+        """Park url for a later attempt; returns False if it should be given up."""
+        host = urlparse(url).netloc
+        if self.is_dead(host):
+            return False
+        now = time.monotonic()
+        ready_at = now
+        if not isinstance(error, CircuitOpenError):
+            delay = self.retry.delay(self.attempts[url], error)
+            if delay is None:
+                return False
+            self.attempts[url] += 1
+            ready_at = now + delay
+            if self.retry.retry_after(error) is not None:
+                self.not_before[host] = max(self.not_before.get(host, 0), ready_at)
+        self.parked[host].append((ready_at, url))
+        return True
+
+    def host_ready_at(self, host):
+        return max(self.breaker.retry_at(host), self.not_before.get(host, 0))
+
+    def defer(self, url):
+        """Park url at no cost if its host may not be contacted yet; returns whether it did."""
+        host = urlparse(url).netloc
+        if self.host_ready_at(host) <= time.monotonic():
+            return False
+        self.parked[host].append((time.monotonic(), url))
+        return True
+
+    def release(self):
+        """Return the parked URLs that may be tried now."""
+        now = time.monotonic()
+        released = []
+        for host in list(self.parked):
+            if self.host_ready_at(host) > now:
+                continue
+            waiting = []
+            for ready_at, url in self.parked.pop(host):
+                if ready_at <= now:
+                    released.append(url)
+                else:
+                    waiting.append((ready_at, url))
+            if waiting:
+                self.parked[host] = waiting
+        return released
+
+    def drop_dead_hosts(self):
+        """Forget the parked URLs of hosts that keep failing; returns them."""
+        dropped = []
+        for host in list(self.parked):
+            if self.is_dead(host):
+                dropped.extend(url for _, url in self.parked.pop(host))
+        return dropped
+
+    def wait(self):
+        """Sleep until the earliest parked URL can be tried again."""
+        if self.parked:
+            wake = min(max(self.host_ready_at(host), min(ready_at for ready_at, _ in urls))
+                       for host, urls in self.parked.items())
+            time.sleep(max(wake - time.monotonic(), 0))
+
+
+class FetchStats:
+    def __init__(self, dns_cache=None):
+        self.dns_cache = dns_cache
+        self.requests = 0
+        self.new_connections = 0
+        self.handshakes = 0
+        self.handshake_time = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self, seconds=None):
+        """Count a new connection attempt; seconds is None if it failed."""
+        with self._lock:
+            self.new_connections += 1
+            if seconds is not None:
+                self.handshakes += 1
+                self.handshake_time += seconds
+
+    def record_handshake(self, seconds):
+        with self._lock:
+            self.handshake_time += seconds
+
+    @property
+    def reuse_ratio(self):
+        """Share of requests served on an already-open connection."""
+        if not self.requests:
+            return 0.0
+        return max(self.requests - self.new_connections, 0) / self.requests
+
+    @property
+    def avg_handshake(self):
+        if not self.handshakes:
+            return 0.0
+        return self.handshake_time / self.handshakes
+
+    def summary(self):
+        text = (f"Requests: {self.requests}, new connections: {self.new_connections}, "
+                f"connection reuse: {self.reuse_ratio:.0%}, "
+                f"avg handshake: {self.avg_handshake * 1000:.1f} ms")
+        if self.dns_cache is not None:
+            text += f", DNS cache hits/misses: {self.dns_cache.hits}/{self.dns_cache.misses}"
+        return text
+
+
+def _timed_pool(base, stats, dns_cache):
+    # Connection pool that resolves hosts through dns_cache and times connect()
+    # (TCP + TLS handshake) on every new connection
+    class TimedPool(base):
+        def _new_conn(self):
+            conn = super()._new_conn()
+            connect = conn.connect
+            dns_host = conn._dns_host
+
+            def timed_connect():
+                addresses = [dns_host]
+                if dns_cache is not None:
+                    try:
+                        addresses = dns_cache.addresses(dns_host, conn.port)
+                    except OSError:
+                        pass    # let urllib3 resolve it and report the error
+                start = time.perf_counter()
+                try:
+                    # Like urllib3, fall back to the next address when one
+                    # cannot be reached. Only the address to dial changes;
+                    # SNI and certificate checks still use conn.host
+                    for i, address in enumerate(addresses):
+                        conn._dns_host = address
+                        try:
+                            connect()
+                            break
+                        except ConnectTimeoutError:
+                            if i == len(addresses) - 1:
+                                raise
+                except Exception:
+                    stats.record_connection()
+                    raise
+                finally:
+                    conn._dns_host = dns_host
+                stats.record_connection(time.perf_counter() - start)
+            conn.connect = timed_connect
+            return conn
+    return TimedPool
+
+
+class StatsAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose pools, direct or through an HTTP(S) proxy, count and
+    time new connections. Connections through SOCKS proxies are not counted.
+    """
+
+    def __init__(self, stats, dns_cache=None, **kwargs):
+        self.stats = stats
+        self.dns_cache = dns_cache
+        self.pool_classes = {
+            'http': _timed_pool(HTTPConnectionPool, stats, dns_cache),
+            'https': _timed_pool(HTTPSConnectionPool, stats, dns_cache),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not proxy.lower().startswith('socks'):
+            manager.pool_classes_by_scheme = self.pool_classes
+        return manager
+
+
+class Fetcher:
+    """
+    Reusable HTTP client for the crawler.
+
+    Keeps persistent keep-alive connections pooled per host (`pool_connections`
+    hosts, up to `pool_maxsize` connections each), caches DNS answers in its
+    own DNSCache for `dns_ttl` seconds (0 disables it) and uses HTTP/2 through
+    httpx when `http2=True` and httpx[http2] is installed; httpx does its own
+    DNS resolution, so no DNSCache is kept with HTTP/2. Errors are raised as
+    requests.RequestException whichever client is in use.
+
+    Each get() is a single attempt. Failed requests are tracked per host by
+    `breaker` (a CircuitBreaker), and requests to a host with an open circuit
+    fail fast with CircuitOpenError. Retrying is left to the caller, usually
+    through a HostParking built from `breaker` and `retry` (a RetryPolicy).
+    """
+
+    def __init__(self, timeout=5, pool_connections=10, pool_maxsize=10,
+                 dns_ttl=300, http2=False, retry=None, breaker=None):
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.dns_cache = DNSCache(dns_ttl) if dns_ttl and not self.http2 else None
+        self.stats = FetchStats(self.dns_cache)
+        if self.http2:
+            limits = httpx.Limits(max_connections=pool_connections * pool_maxsize,
+                                  max_keepalive_connections=pool_connections * pool_maxsize)
+            self.client = httpx.Client(http2=True, limits=limits, timeout=timeout,
+                                       follow_redirects=True)
+        else:
+            self.client = requests.Session()
+            adapter = StatsAdapter(self.stats, self.dns_cache,
+                                   pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize)
+            self.client.mount('http://', adapter)
+            self.client.mount('https://', adapter)
+
+    def get(self, url):
+        """GET url and return the response, raising for HTTP error statuses."""
+        host = urlparse(url).netloc
+        if not self.breaker.allow(host):
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            response = self._get_once(url)
+        except requests.RequestException as e:
+            if self.retry.is_retryable(e):
+                self.breaker.record_failure(host)
+            elif e.response is not None:
+                # The host answered; only the page is bad
+                self.breaker.record_success(host)
+            raise
+        self.breaker.record_success(host)
+        return response
+
+    def is_transient(self, error):
+        """Whether a failed fetch is worth trying again later."""
+        return isinstance(error, CircuitOpenError) or self.retry.is_retryable(error)
+
+    def _get_once(self, url):
+        self.stats.record_request()
+        if self.http2:
+            return self._get_http2(url)
+        response = self.client.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def _get_http2(self, url):
+        started = {}
+
+        def trace(event, info):
+            # httpcore reports connection setup as *.started / *.complete pairs
+            step, _, phase = event.rpartition('.')
+            if phase == 'started':
+                started[step] = time.perf_counter()
+            elif phase == 'failed' and step == 'connection.connect_tcp':
+                self.stats.record_connection()
+            elif phase == 'complete' and step in started:
+                elapsed = time.perf_counter() - started.pop(step)
+                if step == 'connection.connect_tcp':
+                    self.stats.record_connection(elapsed)
+                elif step == 'connection.start_tls':
+                    self.stats.record_handshake(elapsed)
+
+        try:
+            response = self.client.get(url, extensions={'trace': trace})
+            response.raise_for_status()
+            return response
+        except httpx.HTTPStatusError as e:
+            raise requests.HTTPError(str(e), response=e.response) from e
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e)) from e
+        except httpx.HTTPError as e:
+            raise requests.RequestException(str(e)) from e
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
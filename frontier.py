@@ -0,0 +1,214 @@
+import re
+from collections import defaultdict, deque
+
+
+class IndexedHeap:
+    """
+    Max-priority queue keyed by item, with O(log n) push, pop and priority update.
+    Items with equal priority come out in insertion order.
+    """
+
+    def __init__(self):
+        self._heap = []        # entries are [priority, seq, item]
+        self._index = {}       # item -> position in self._heap
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def push(self, item, priority):
+        """Insert item, or change its priority if it is already queued."""
+        if item in self._index:
+            self.update(item, priority)
+            return
+        entry = [priority, self._seq, item]
+        self._seq += 1
+        self._heap.append(entry)
+        self._index[item] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, item, priority):
+        pos = self._index[item]
+        old = self._heap[pos][0]
+        self._heap[pos][0] = priority
+        if priority > old:
+            self._sift_up(pos)
+        elif priority < old:
+            self._sift_down(pos)
+
+    def pop(self):
+        """Remove and return the (item, priority) pair with the highest priority."""
+        top = self._heap[0]
+        last = self._heap.pop()
+        del self._index[top[2]]
+        if self._heap:
+            self._heap[0] = last
+            self._index[last[2]] = 0
+            self._sift_down(0)
+        return top[2], top[0]
+
+    def _before(self, a, b):
+        # Higher priority first, then lower sequence number (FIFO among ties)
+        return a[0] > b[0] or (a[0] == b[0] and a[1] < b[1])
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][2]] = i
+        self._index[heap[j][2]] = j
+
+    def _sift_up(self, pos):
+        while pos > 0:
+            parent = (pos - 1) // 2
+            if not self._before(self._heap[pos], self._heap[parent]):
+                break
+            self._swap(pos, parent)
+            pos = parent
+
+    def _sift_down(self, pos):
+        size = len(self._heap)
+        while True:
+            best = pos
+            for child in (2 * pos + 1, 2 * pos + 2):
+                if child < size and self._before(self._heap[child], self._heap[best]):
+                    best = child
+            if best == pos:
+                break
+            self._swap(pos, best)
+            pos = best
+
+
+class BestFirstFrontier:
+    """
+    Crawl frontier that always hands out the highest-scoring URL next.
+
+    It keeps live link-graph signals for every URL seen so far (in-link count,
+    OPIC cash and crawl depth) and re-scores queued URLs whenever a fetched
+    page changes those signals. `score` is any callable taking (url, frontier)
+    and returning a number; higher is crawled first.
+    """
+
+    def __init__(self, score):
+        self.score = score
+        self.queue = IndexedHeap()
+        self.inlinks = defaultdict(int)
+        self.cash = defaultdict(float)
+        self.history = defaultdict(float)
+        self.depth = {}
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, url):
+        return url in self.queue
+
+    def add(self, url, depth=None, cash=0.0):
+        # depth=None keeps the known depth (e.g. a URL coming back from parking);
+        # otherwise keep the shortest known path. push() re-scores a queued URL
+        if depth is None:
+            self.depth.setdefault(url, 0)
+        else:
+            self.depth[url] = min(self.depth.get(url, depth), depth)
+        self.cash[url] += cash
+        self.queue.push(url, self.score(url, self))
+
+    def pop(self):
+        url, _ = self.queue.pop()
+        return url
+
+    def record_links(self, url, links, visited=()):
+        """
+        Update the link-graph signals after `url` was fetched and queue its
+        unvisited `links`.
+
+        OPIC: the page's cash is moved to its history and split evenly
+        between its out-links.
+        """
+        links = set(links)
+        links.discard(url)
+        share = self.cash[url] / len(links) if links else 0.0
+        self.history[url] += self.cash[url]
+        self.cash[url] = 0.0
+        child_depth = self.depth.get(url, 0) + 1
+        for link in links:
+            self.inlinks[link] += 1
+            if link in visited:
+                self.cash[link] += share
+            else:
+                self.add(link, depth=child_depth, cash=share)
+
+
+class FifoFrontier:
+    """
+    Breadth-first frontier: URLs are handed out in discovery order. Same
+    interface as BestFirstFrontier so the crawl loop can use either.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.queued = set()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, url):
+        return url in self.queued
+
+    def add(self, url, depth=None, cash=0.0):
+        if url not in self.queued:
+            self.queue.append(url)
+            self.queued.add(url)
+
+    def pop(self):
+        url = self.queue.popleft()
+        self.queued.discard(url)
+        return url
+
+    def record_links(self, url, links, visited=()):
+        for link in links:
+            if link != url and link not in visited:
+                self.add(link)
+
+
+# Scoring functions: each takes (url, frontier) and returns a priority.
+
+def inlink_score(url, frontier):
+    return frontier.inlinks[url]
+
+
+def opic_score(url, frontier):
+    return frontier.cash[url] + frontier.history[url]
+
+
+def depth_score(url, frontier):
+    # Shallower pages first
+    return -frontier.depth.get(url, 0)
+
+
+def pattern_score(weights):
+    """
+    Build a scorer from {regex: weight}; a URL scores the sum of the weights
+    of every pattern it matches.
+    """
+    compiled = [(re.compile(pattern), weight) for pattern, weight in weights.items()]
+
+    def score(url, frontier):
+        return sum(weight for regex, weight in compiled if regex.search(url))
+    return score
+
+
+def combined_score(*weighted_scorers):
+    """Linear combination of (scorer, weight) pairs."""
+    def score(url, frontier):
+        return sum(weight * scorer(url, frontier) for scorer, weight in weighted_scorers)
+    return score
+
+
+SCORERS = {
+    'inlinks': inlink_score,
+    'opic': opic_score,
+    'depth': depth_score,
+}
@@ -0,0 +1,344 @@
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from fetcher import (CircuitBreaker, CircuitOpenError, DNSCache, FetchStats, Fetcher,
+                     HostParking, RetryPolicy, parse_retry_after)
+
+SYSTEM_GETADDRINFO = socket.getaddrinfo
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'<a href="/next">next</a>'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _counting_resolver(calls):
+    def resolve(host, port, *args, **kwargs):
+        calls.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+    return resolve
+
+
+def test_dns_cache_reuses_answers_until_ttl_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('fetcher.time.monotonic', lambda: now[0])
+    calls = []
+    cache = DNSCache(ttl=10, resolver=_counting_resolver(calls))
+    assert cache.addresses('a.test', 80) == ['127.0.0.1']
+    cache.addresses('a.test', 80)
+    cache.addresses('b.test', 80)
+    now[0] += 11
+    cache.addresses('a.test', 80)
+    assert calls == ['a.test', 'b.test', 'a.test']
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_dns_cache_does_not_cache_failures():
+    calls = []
+
+    def failing(host, *args, **kwargs):
+        calls.append(host)
+        raise socket.gaierror('no such host')
+    cache = DNSCache(resolver=failing)
+    for _ in range(2):
+        with pytest.raises(socket.gaierror):
+            cache.addresses('gone.test', 80)
+    assert len(calls) == 2
+
+
+def test_fetch_stats_count_failed_connects_as_new_connections():
+    stats = FetchStats()
+    for _ in range(4):
+        stats.record_request()
+    stats.record_connection(0.02)
+    stats.record_connection()
+    assert stats.new_connections == 2
+    assert stats.reuse_ratio == 0.5
+    assert stats.avg_handshake == pytest.approx(0.02)
+
+
+def test_fetcher_reuses_connection_and_dns(server):
+    calls = []
+    with Fetcher(dns_ttl=60) as fetcher:
+        fetcher.dns_cache._resolve = _counting_resolver(calls)
+        for path in ('/', '/a', '/b'):
+            assert 'next' in fetcher.get(server + path).text
+        assert fetcher.stats.requests == 3
+        assert fetcher.stats.new_connections == 1
+        assert fetcher.stats.reuse_ratio == pytest.approx(2 / 3)
+        assert calls == ['localhost']
+
+
+def test_fetcher_falls_back_to_next_cached_address(server):
+    port = int(server.rsplit(':', 1)[1])
+
+    def two_records(host, port, *args, **kwargs):
+        # Nothing listens on 127.0.0.2; the server is bound to 127.0.0.1 only
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.2', port)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+    with Fetcher(dns_ttl=60) as fetcher:
+        fetcher.dns_cache._resolve = two_records
+        assert fetcher.get(f"http://localhost:{port}/").status_code == 200
+        assert fetcher.stats.new_connections == 1
+
+
+def test_fetcher_counts_connections_through_a_proxy(server):
+    with Fetcher(dns_ttl=0) as fetcher:
+        fetcher.client.proxies = {'http': server}
+        for path in ('/', '/a'):
+            assert fetcher.get('http://proxied.test' + path).status_code == 200
+        assert fetcher.stats.requests == 2
+        assert fetcher.stats.new_connections == 1
+
+
+def test_fetcher_dns_cache_is_per_instance(server):
+    with Fetcher(dns_ttl=60) as cached, Fetcher(dns_ttl=0) as uncached:
+        assert uncached.dns_cache is None
+        assert cached.dns_cache is not None
+        uncached.get(server)
+        assert cached.dns_cache.misses == 0
+    assert socket.getaddrinfo is SYSTEM_GETADDRINFO
+
+
+def test_refused_connection_lowers_reuse_ratio():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    with Fetcher(dns_ttl=0) as fetcher:
+        with pytest.raises(requests.ConnectionError):
+            fetcher.get(f"http://127.0.0.1:{port}/")
+        assert fetcher.stats.new_connections >= fetcher.stats.requests
+        assert fetcher.stats.reuse_ratio == 0.0
+
+
+class _StubClient:
+    """Stands in for requests.Session: returns or raises queued outcomes."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(url, outcome)
+
+    def close(self):
+        pass
+
+
+def _response(url, status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    response.headers.update(headers or {})
+    response._content = b''
+    return response
+
+
+def _stub_fetcher(*outcomes, **breaker_kwargs):
+    fetcher = Fetcher(dns_ttl=0, breaker=CircuitBreaker(**breaker_kwargs))
+    fetcher.client = _StubClient(*outcomes)
+    return fetcher
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('fetcher.time.monotonic', lambda: now[0])
+    return now
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after(' 0 ') == 0.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_retry_policy_classifies_errors():
+    policy = RetryPolicy()
+    assert policy.is_retryable(requests.Timeout())
+    assert policy.is_retryable(requests.ConnectionError())
+    assert not policy.is_retryable(requests.exceptions.SSLError())
+    assert not policy.is_retryable(requests.exceptions.InvalidURL())
+    assert policy.is_retryable(requests.HTTPError(response=_response('u', 503)))
+    assert not policy.is_retryable(requests.HTTPError(response=_response('u', 404)))
+
+
+def test_retry_policy_delays():
+    policy = RetryPolicy(max_retries=3, backoff=1, max_backoff=3, max_retry_after=60, jitter=False)
+    assert [policy.delay(i) for i in range(4)] == [1, 2, 3, None]
+    throttled = requests.HTTPError(response=_response('u', 429, {'Retry-After': '45'}))
+    assert policy.delay(0, throttled) == 45
+    too_long = requests.HTTPError(response=_response('u', 429, {'Retry-After': '600'}))
+    assert policy.delay(0, too_long) is None
+    jittered = RetryPolicy(max_retries=10, backoff=1, max_backoff=3)
+    assert all(0 <= jittered.delay(5) <= 3 for _ in range(50))
+
+
+def test_circuit_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure('h')
+    assert breaker.allow('h')
+    breaker.record_failure('h')
+    assert not breaker.allow('h') and breaker.trips['h'] == 1
+    clock[0] += 30
+    assert breaker.allow('h')          # the half-open trial
+    assert not breaker.allow('h')      # everyone else waits for it
+    breaker.record_failure('h')
+    assert breaker.trips['h'] == 2 and breaker.retry_at('h') == clock[0] + 30
+    clock[0] += 30
+    assert breaker.allow('h')
+    breaker.record_success('h')
+    assert breaker.allow('h') and not breaker.is_open('h') and breaker.trips['h'] == 0
+    assert breaker.retry_at('h') == 0.0
+
+
+def test_get_is_one_attempt_and_one_breaker_failure():
+    fetcher = _stub_fetcher(requests.Timeout('slow'), failure_threshold=2)
+    with pytest.raises(requests.Timeout):
+        fetcher.get('http://a.test/')
+    assert fetcher.client.calls == 1
+    assert fetcher.breaker.failures['a.test'] == 1
+
+
+def test_get_fails_fast_when_circuit_open():
+    fetcher = _stub_fetcher(requests.ConnectionError('refused'), failure_threshold=1)
+    with pytest.raises(requests.ConnectionError):
+        fetcher.get('http://a.test/')
+    with pytest.raises(CircuitOpenError):
+        fetcher.get('http://a.test/other')
+    assert fetcher.client.calls == 1
+
+
+def test_only_real_responses_close_the_circuit():
+    fetcher = _stub_fetcher(requests.Timeout(), requests.exceptions.InvalidURL('bad'),
+                            404, failure_threshold=3)
+    for _ in range(3):
+        with pytest.raises(requests.RequestException):
+            fetcher.get('http://a.test/')
+    assert fetcher.breaker.failures.get('a.test') is None
+    fetcher = _stub_fetcher(requests.Timeout(), requests.exceptions.InvalidURL('bad'),
+                            failure_threshold=3)
+    for _ in range(2):
+        with pytest.raises(requests.RequestException):
+            fetcher.get('http://a.test/')
+    assert fetcher.breaker.failures['a.test'] == 1
+
+
+def test_ssl_errors_are_not_transient():
+    fetcher = _stub_fetcher(requests.exceptions.SSLError('bad cert'))
+    with pytest.raises(requests.exceptions.SSLError) as info:
+        fetcher.get('https://a.test/')
+    assert not fetcher.is_transient(info.value)
+    assert fetcher.breaker.failures.get('a.test') is None
+
+
+def test_parking_honours_retry_after_for_the_whole_host(clock):
+    parking = HostParking(CircuitBreaker(), RetryPolicy(jitter=False))
+    throttled = requests.HTTPError(response=_response('u', 503, {'Retry-After': '120'}))
+    assert parking.park('http://a.test/1', throttled)
+    assert parking.defer('http://a.test/2')
+    assert not parking.defer('http://b.test/1')
+    clock[0] += 119
+    assert parking.release() == []
+    clock[0] += 1
+    assert sorted(parking.release()) == ['http://a.test/1', 'http://a.test/2']
+    assert len(parking) == 0
+
+
+def test_parking_releases_with_a_running_clock():
+    parking = HostParking(CircuitBreaker(), RetryPolicy(backoff=0.01, jitter=False))
+    assert parking.park('http://a.test/1', requests.Timeout())
+    parking.wait()
+    assert parking.release() == ['http://a.test/1']
+
+
+def test_parking_backs_off_per_url_and_gives_up(clock):
+    parking = HostParking(CircuitBreaker(), RetryPolicy(max_retries=2, backoff=1, jitter=False))
+    assert parking.park('http://a.test/1', requests.Timeout())
+    assert parking.release() == []
+    clock[0] += 1
+    assert parking.release() == ['http://a.test/1']
+    assert parking.park('http://a.test/1', requests.Timeout())
+    clock[0] += 1
+    assert parking.release() == []
+    clock[0] += 1
+    assert parking.release() == ['http://a.test/1']
+    assert not parking.park('http://a.test/1', requests.Timeout())
+
+
+def test_parking_drops_hosts_whose_circuit_keeps_reopening(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    parking = HostParking(breaker, RetryPolicy(), max_trips=2)
+    breaker.record_failure('dead.test')
+    assert parking.defer('http://dead.test/1')
+    assert parking.park('http://dead.test/2', CircuitOpenError())
+    assert parking.park('http://live.test/1', CircuitOpenError())
+    clock[0] += 30
+    assert breaker.allow('dead.test')
+    breaker.record_failure('dead.test')
+    assert sorted(parking.drop_dead_hosts()) == ['http://dead.test/1', 'http://dead.test/2']
+    assert not parking.park('http://dead.test/3', requests.Timeout())
+    assert parking.release() == ['http://live.test/1']
+
+
+def test_http2_client_maps_errors_and_records_stats():
+    httpx = pytest.importorskip('httpx')
+    pytest.importorskip('h2')
+
+    def handler(request):
+        trace = request.extensions['trace']
+        trace('connection.connect_tcp.started', {})
+        trace('connection.connect_tcp.complete', {})
+        if request.url.path == '/slow':
+            raise httpx.ConnectTimeout('slow', request=request)
+        if request.url.path == '/down':
+            raise httpx.ConnectError('refused', request=request)
+        if request.url.path == '/busy':
+            return httpx.Response(503, headers={'Retry-After': '7'})
+        return httpx.Response(200, text='ok')
+
+    with Fetcher(http2=True) as fetcher:
+        assert fetcher.http2 and fetcher.dns_cache is None
+        fetcher.client = httpx.Client(transport=httpx.MockTransport(handler))
+        assert fetcher.get('https://a.test/').text == 'ok'
+        with pytest.raises(requests.Timeout):
+            fetcher.get('https://a.test/slow')
+        with pytest.raises(requests.ConnectionError):
+            fetcher.get('https://a.test/down')
+        with pytest.raises(requests.HTTPError) as info:
+            fetcher.get('https://a.test/busy')
+        assert fetcher.is_transient(info.value)
+        assert fetcher.retry.retry_after(info.value) == 7
+        assert fetcher.stats.requests == 4
+        assert fetcher.stats.new_connections == 4
+        assert 'DNS cache' not in fetcher.stats.summary()
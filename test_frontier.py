@@ -0,0 +1,95 @@
+import random
+
+from frontier import (BestFirstFrontier, FifoFrontier, IndexedHeap, combined_score,
+                      depth_score, inlink_score, opic_score, pattern_score)
+
+
+def test_heap_matches_reference_under_random_pushes_and_updates():
+    rng = random.Random(0)
+    heap = IndexedHeap()
+    expected = {}
+    for _ in range(3000):
+        key = rng.randrange(300)
+        priority = rng.randrange(50)
+        heap.push(key, priority)
+        expected[key] = priority
+        if rng.random() < 0.2 and len(heap):
+            item, prio = heap.pop()
+            assert prio == max(expected.values())
+            assert expected.pop(item) == prio
+    popped = [heap.pop() for _ in range(len(heap))]
+    assert [p for _, p in popped] == sorted(expected.values(), reverse=True)
+    assert dict(popped) == expected
+
+
+def test_heap_ties_pop_in_insertion_order():
+    heap = IndexedHeap()
+    for item in 'abcd':
+        heap.push(item, 1)
+    heap.update('c', 1)
+    assert [heap.pop()[0] for _ in range(4)] == list('abcd')
+
+
+def test_heap_update_moves_item_both_ways():
+    heap = IndexedHeap()
+    for item, priority in [('a', 1), ('b', 2), ('c', 3)]:
+        heap.push(item, priority)
+    heap.update('a', 5)
+    heap.push('c', 0)
+    assert 'a' in heap and len(heap) == 3
+    assert [heap.pop() for _ in range(3)] == [('a', 5), ('b', 2), ('c', 0)]
+    assert 'a' not in heap
+
+
+def test_fifo_frontier_keeps_discovery_order_and_skips_duplicates():
+    frontier = FifoFrontier()
+    frontier.add('/')
+    assert frontier.pop() == '/'
+    frontier.record_links('/', ['/a', '/b', '/'], visited={'/'})
+    frontier.record_links('/a', ['/b', '/c'], visited={'/'})
+    assert [frontier.pop() for _ in range(len(frontier))] == ['/a', '/b', '/c']
+
+
+def test_opic_splits_cash_between_out_links():
+    frontier = BestFirstFrontier(opic_score)
+    frontier.add('/', cash=1.0)
+    frontier.pop()
+    frontier.record_links('/', ['/a', '/b'], visited={'/'})
+    assert frontier.history['/'] == 1.0 and frontier.cash['/'] == 0.0
+    assert frontier.cash['/a'] == frontier.cash['/b'] == 0.5
+    first = frontier.pop()
+    other = '/b' if first == '/a' else '/a'
+    frontier.record_links(first, [other], visited={'/', first})
+    assert frontier.cash[other] == 1.0
+    assert frontier.pop() == other
+
+
+def test_inlinks_reorder_queued_urls():
+    frontier = BestFirstFrontier(inlink_score)
+    frontier.add('/')
+    frontier.pop()
+    frontier.record_links('/', ['/a', '/b'], visited={'/'})
+    frontier.record_links('/x', ['/b'], visited={'/'})
+    assert frontier.pop() == '/b'
+
+
+def test_depth_keeps_shortest_path():
+    frontier = BestFirstFrontier(depth_score)
+    frontier.add('/deep', depth=5)
+    frontier.add('/mid', depth=2)
+    frontier.add('/deep', depth=1)
+    assert frontier.depth['/deep'] == 1
+    frontier.add('/deep', depth=3)
+    assert frontier.depth['/deep'] == 1
+    assert frontier.pop() == '/deep'
+
+
+def test_pattern_and_combined_scores():
+    blog = pattern_score({r'/blog/': 2, r'\.pdf$': -5})
+    assert blog('https://a.com/blog/post', None) == 2
+    assert blog('https://a.com/blog/x.pdf', None) == -3
+    frontier = BestFirstFrontier(combined_score((blog, 1), (inlink_score, 10)))
+    frontier.add('https://a.com/blog/post')
+    frontier.add('https://a.com/about')
+    frontier.record_links('https://a.com/', ['https://a.com/about'])
+    assert frontier.pop() == 'https://a.com/about'
@@ -0,0 +1,161 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pytest
+
+from fetcher import CircuitBreaker, Fetcher, RetryPolicy
+from frontier import depth_score
+from web_crawler import crawl_website, extract_links, get_html
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    """Serves site.graph as HTML pages, misbehaving as site.trouble / site.down say."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        site = self.server.site
+        site.requests.append(self.path)
+        trouble = site.trouble.get(self.path)
+        kind = trouble.pop(0) if trouble else None
+        if kind == 503 or self.path in site.down:
+            self._send(503, b'', {'Retry-After': '0'} if kind == 503 else {})
+            return
+        if kind == 'slow':
+            time.sleep(0.5)
+        links = site.graph.get(self.path, [])
+        self._send(200, ''.join(f'<a href="{link}">{link}</a>' for link in links).encode())
+
+    def _send(self, status, body, headers=None):
+        try:
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass    # the client gave up on a slow response
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _SiteHandler)
+    httpd.site = SimpleNamespace(graph={}, trouble={}, down=set(), requests=[],
+                                 url=f"http://127.0.0.1:{httpd.server_address[1]}")
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.site
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    with Fetcher(timeout=0.2, dns_ttl=0, retry=RetryPolicy(backoff=0.01),
+                 breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.1)) as fetcher:
+        yield fetcher
+
+
+def _paths(site, data):
+    return [page['url'][len(site.url):] for page in data]
+
+
+def test_transient_failures_are_requeued_and_crawled(site, fetcher):
+    site.graph = {'/': ['/flaky', '/slow', '/ok']}
+    site.trouble = {'/flaky': [503], '/slow': ['slow']}
+    data = crawl_website(site.url + '/', max_pages=10, fetcher=fetcher)
+    assert sorted(_paths(site, data)) == ['/', '/flaky', '/ok', '/slow']
+    assert site.requests.count('/flaky') == 2
+    assert site.requests.count('/slow') == 2
+
+
+def test_requeued_pages_keep_their_depth(site, fetcher):
+    site.graph = {'/': ['/a'], '/a': ['/a/b'], '/a/b': ['/a/b/c']}
+    site.trouble = {'/a/b': [503]}
+    seen = {}
+
+    def score(url, frontier):
+        seen['frontier'] = frontier
+        return depth_score(url, frontier)
+    data = crawl_website(site.url + '/', max_pages=10, score=score, fetcher=fetcher)
+    assert _paths(site, data) == ['/', '/a', '/a/b', '/a/b/c']
+    depth = seen['frontier'].depth
+    assert depth[site.url + '/a/b'] == 2
+    assert depth[site.url + '/a/b/c'] == 3
+
+
+def test_failing_host_ends_the_crawl(site, fetcher):
+    site.graph = {'/': [f'/p{i}' for i in range(20)]}
+    site.down = {f'/p{i}' for i in range(20)}
+    started = time.monotonic()
+    data = crawl_website(site.url + '/', max_pages=50, fetcher=fetcher)
+    assert _paths(site, data) == ['/']
+    assert time.monotonic() - started < 5
+    assert len(site.requests) < 10
+
+
+def test_next_crawl_retries_a_host_given_up_on(site, fetcher):
+    site.graph = {'/': [f'/p{i}' for i in range(5)]}
+    site.down = {f'/p{i}' for i in range(5)}
+    crawl_website(site.url + '/', max_pages=50, fetcher=fetcher)
+    assert fetcher.breaker.trips
+    site.down = set()
+    data = crawl_website(site.url + '/', max_pages=50, fetcher=fetcher)
+    assert len(data) == 6
+
+
+def _baseline_bfs(start_url, max_pages, fetcher):
+    # The original FIFO crawl loop, kept as the reference for score=None
+    visited = set()
+    to_visit = [start_url]
+    order = []
+    while to_visit and len(visited) < max_pages:
+        url = to_visit.pop(0)
+        if url in visited:
+            continue
+        html = get_html(url, fetcher)
+        if html is None:
+            continue
+        for link in extract_links(html, url):
+            if urlparse(link).netloc == urlparse(start_url).netloc:
+                if link not in visited and link not in to_visit:
+                    to_visit.append(link)
+        visited.add(url)
+        order.append(url)
+    return order
+
+
+@pytest.fixture
+def star_site(site):
+    # Three sections of three pages each, and every one of those pages links
+    # to /star, which sits one level below all of them
+    site.graph = {'/': ['/l1', '/l2', '/l3']}
+    for i in range(1, 4):
+        site.graph[f'/l{i}'] = [f'/m{i}{j}' for j in range(1, 4)]
+        for j in range(1, 4):
+            site.graph[f'/m{i}{j}'] = ['/star', f'/n{i}{j}']
+    return site
+
+
+def test_fifo_crawl_matches_baseline_bfs(star_site, fetcher):
+    start = star_site.url + '/'
+    for budget in (5, 13, 30):
+        data = crawl_website(start, max_pages=budget, fetcher=fetcher)
+        assert [page['url'] for page in data] == _baseline_bfs(start, budget, fetcher)
+
+
+@pytest.mark.parametrize('score', ['inlinks', 'opic'])
+def test_best_first_reaches_highly_linked_page_within_budget(star_site, fetcher, score):
+    start = star_site.url + '/'
+    fifo = _paths(star_site, crawl_website(start, max_pages=30, fetcher=fetcher))
+    best = _paths(star_site, crawl_website(start, max_pages=8, score=score, fetcher=fetcher))
+    assert '/star' in best
+    assert best.index('/star') < fifo.index('/star')
+    assert fifo.index('/star') >= 13     # FIFO spends 13 pages on the upper levels first
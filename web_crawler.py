@@ -2,14 +2,33 @@ import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 import json
+from frontier import BestFirstFrontier, FifoFrontier, SCORERS
+from fetcher import Fetcher, HostParking
 
-def get_html(url):
+_default_fetcher = None
+
+def default_fetcher():
+    global _default_fetcher
+    if _default_fetcher is None:
+        _default_fetcher = Fetcher()
+    return _default_fetcher
+
+def get_html(url, fetcher=None, parking=None):
+    """
+    Fetch url and return its HTML, or None on failure. With parking (a
+    fetcher.HostParking), transient failures are parked for a later attempt.
+    """
+    fetcher = fetcher or default_fetcher()
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
+        response = fetcher.get(url)
         return response.text
     except requests.RequestException as e:
         print(f"Failed to retrieve {url}: {e}")
+        if parking is not None and fetcher.is_transient(e):
+            if parking.park(url, e):
+                print(f"Re-queued: {url}")
+            else:
+                print(f"Giving up on {url}")
         return None
 
 def extract_links(html, base_url):
@@ -25,19 +44,51 @@ def extract_links(html, base_url):
 def is_internal_link(link, base_domain):
     return urlparse(link).netloc == base_domain
 
-def crawl_website(start_url, max_pages=100):
+def crawl_website(start_url, max_pages=100, score=None, fetcher=None):
+    """
+    Crawl internal pages starting from start_url.
+
+    With score=None pages are visited breadth-first in discovery order.
+    Otherwise the crawl is best-first: score is a name from frontier.SCORERS
+    ('inlinks', 'opic', 'depth') or a callable (url, frontier) -> number, and
+    the highest-scoring discovered URL is fetched next.
+
+    Pages are downloaded through fetcher (a fetcher.Fetcher), defaulting to
+    a shared one so connections and DNS lookups are reused across crawls.
+    Pages that fail transiently are parked and re-queued after their backoff
+    or Retry-After, once their host's circuit breaker allows it; other pages
+    are crawled meanwhile.
+    """
+    if score is None:
+        frontier = FifoFrontier()
+    else:
+        frontier = BestFirstFrontier(SCORERS[score] if isinstance(score, str) else score)
+    fetcher = fetcher or default_fetcher()
+    # The breaker outlives the crawl on a shared fetcher; hosts that were
+    # given up on last time get a fresh set of trips
+    fetcher.breaker.reset_trips()
+    parking = HostParking(fetcher.breaker, fetcher.retry)
     visited = set()
-    to_visit = [start_url]
+    attempted = set()
+    frontier.add(start_url, depth=0, cash=1.0)
     base_domain = urlparse(start_url).netloc
-    
+
     extracted_data = []
-    
-    while to_visit and len(visited) < max_pages:
-        url = to_visit.pop(0)
-        if url in visited:
+
+    while (frontier or parking) and len(visited) < max_pages:
+        for url in parking.drop_dead_hosts():
+            print(f"Giving up on {url}: host keeps failing")
+        for url in parking.release():
+            frontier.add(url)
+        if not frontier:
+            parking.wait()
+            continue
+        url = frontier.pop()
+        attempted.add(url)
+        if parking.defer(url):
             continue
         print(f"Crawling: {url}")
-        html = get_html(url)
+        html = get_html(url, fetcher, parking)
         if html is None:
             continue
         links = extract_links(html, url)
@@ -46,11 +97,11 @@ def crawl_website(start_url, max_pages=100):
         for link in links:
             if is_internal_link(link, base_domain):
                 internal_links.add(link)
-                if link not in visited and link not in to_visit:
-                    to_visit.append(link)
             else:
                 external_links.add(link)
         visited.add(url)
+        # Same discovery order the FIFO crawl always used
+        frontier.record_links(url, [link for link in links if link in internal_links], attempted)
         extracted_data.append({
             'url': url,
             'internal_links': list(internal_links),
@@ -64,6 +115,7 @@ def save_to_json(data, filename='crawled_links.json'):
 
 if __name__ == "__main__":
     start_url = 'https://example.com'  # Replace this with the website you want to crawl
-    data = crawl_website(start_url, max_pages=20)
+    data = crawl_website(start_url, max_pages=20)  # pass score='opic' for best-first order
     save_to_json(data)
     print(f"Crawled {len(data)} pages. Data saved to 'crawled_links.json'.")
+    print(default_fetcher().stats.summary())